@@ -1,7 +1,9 @@
+import io
+
 import streamlit as st
 import pandas as pd
 import folium
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
 from folium.plugins import Fullscreen, MeasureControl
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -18,241 +20,413 @@ Flight Route Analysis app presents an analysis of the busiest passenger flight r
 Explore the data, visualize passenger trends, and interact with a global map of the top routes.
 """)
 
-# Function to load data from MongoDB or CSV
+# Columns the app actually uses; doubles as the MongoDB projection and as the
+# explicit column list when building the DataFrame (skips column inference)
+DATA_COLUMNS = [
+    "From", "To", "Type", "Year", "Passengers", "From_Country",
+    "From_Lat", "From_Lon", "To_Lat", "To_Lon",
+]
+
+CSV_PATH = "busist_flight.csv"
+PARQUET_PATH = "busist_flight.parquet"
+
+# Keep one pooled client per session so the TCP handshake is not repeated
+# on every cache miss
+@st.cache_resource
+def get_collection():
+    client = MongoClient(
+        "mongodb://localhost:27017/",
+        maxPoolSize=5,
+        serverSelectionTimeoutMS=1000,
+    )
+    return client["flight_routes_db"]["flight_routess"]
+
+def add_route_column(data):
+    # The Route column is derived from the city names (see the notebook)
+    if "Route" not in data.columns:
+        data["Route"] = data["From"] + " to " + data["To"]
+    return data
+
+def optimize_dtypes(data):
+    # Category codes make the repeated groupbys integer-based instead of
+    # hashing strings on every call, and shrink the cached frame
+    for col in ("Type", "From_Country", "From", "To", "Route"):
+        data[col] = data[col].astype("category")
+    data["Year"] = pd.to_numeric(data["Year"], downcast="integer")
+    data["Passengers"] = pd.to_numeric(data["Passengers"], downcast="integer")
+    for col in ("From_Lat", "From_Lon", "To_Lat", "To_Lon"):
+        data[col] = data[col].astype("float32")
+    return data
+
+# Fallback source when MongoDB is unreachable. Parquet loads through Arrow
+# with dtypes preserved, so the CSV is only ever parsed once; after that a
+# Parquet copy is kept next to it for future cold starts
+@st.cache_data
+def load_local_data():
+    if os.path.exists(PARQUET_PATH):
+        data = pd.read_parquet(PARQUET_PATH, engine="pyarrow", columns=DATA_COLUMNS)
+        return optimize_dtypes(add_route_column(data))
+    if os.path.exists(CSV_PATH):
+        data = pd.read_csv(CSV_PATH)
+        try:
+            data.to_parquet(PARQUET_PATH, engine="pyarrow", index=False)
+        except Exception:
+            pass  # pyarrow missing or directory read-only; CSV still works
+        # Keep only the columns the app touches; scraper extras would just
+        # sit in the cache and slow every scan
+        return optimize_dtypes(add_route_column(data[DATA_COLUMNS]))
+    return None
+
+# Function to load the distinct filter values without pulling full documents
 @st.cache_data
-def load_data():
+def load_schema():
     try:
-        # Attempt to connect to MongoDB
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client["flight_routes_db"]
-        collection = db["flight_routess"]
-        data = pd.DataFrame(list(collection.find()))
-        client.close()
-        st.success("Data loaded from MongoDB")
-        return data
+        collection = get_collection()
+        years = sorted(collection.distinct("Year"))
+        types = sorted(collection.distinct("Type"))
+        return years, types, "MongoDB"
     except Exception as e:
         st.warning(f"Could not connect to MongoDB: {e}")
-        # Fallback to CSV if available
-        if os.path.exists("busist_flight.csv.csv"):
-            data = pd.read_csv("busist_flight.csv.csv")
-            st.success("Data loaded from CSV")
-            return data
-        else:
+        data = load_local_data()
+        if data is None:
             st.error("No data source available. Please ensure MongoDB is running or provide a CSV file.")
             return None
+        return sorted(data["Year"].unique()), sorted(data["Type"].unique()), "CSV"
+
+# Function to load only the rows matching the current filter selection;
+# the Year/Type filters are pushed down to the server and `_id` is excluded
+# by projection so only the needed columns travel over the wire
+@st.cache_data
+def load_filtered(years, types):
+    try:
+        collection = get_collection()
+        projection = {field: 1 for field in DATA_COLUMNS}
+        projection["_id"] = 0
+        cursor = collection.find(
+            {"Year": {"$in": list(years)}, "Type": {"$in": list(types)}},
+            projection,
+        )
+        data = pd.DataFrame.from_records(cursor, columns=DATA_COLUMNS)
+        return optimize_dtypes(add_route_column(data))
+    except Exception:
+        data = load_local_data()
+        if data is None:
+            return None
+        # The selected years may be Mongo-sourced strings ("2011") while the
+        # local frame's Year is numeric after optimize_dtypes; normalize them
+        # so a mid-session failover still matches rows
+        years = pd.to_numeric(pd.Series(list(years)), errors="coerce")
+        return data[data["Year"].isin(years) & data["Type"].isin(types)]
+
+# Aggregations memoized on the filter selection so widget-only reruns
+# (map pans, sidebar tweaks) reuse previous results instead of re-scanning
+@st.cache_data(show_spinner=False)
+def _yearly(years, types):
+    data = load_filtered(years, types)
+    return data.groupby("Year")["Passengers"].sum()
+
+@st.cache_data(show_spinner=False)
+def _country_type(years, types):
+    data = load_filtered(years, types)
+    return data.groupby(["From_Country", "Type"], observed=True)["Passengers"].sum()
+
+@st.cache_data(show_spinner=False)
+def _top_departure(years, types):
+    grouped = _country_type(years, types)
+    # Pick the five busiest countries first, then pivot only their rows
+    # instead of unstacking the full country x type matrix
+    top5 = grouped.groupby(level=0, observed=True).sum().nlargest(5).index.tolist()
+    # Select by mask rather than .loc: label-based lookup raises KeyError
+    # when the categorical index level carries unused categories
+    sub = grouped[grouped.index.get_level_values(0).isin(top5)]
+    return sub.unstack(fill_value=0).reindex(top5)
+
+@st.cache_data(show_spinner=False)
+def _top_routes(years, types):
+    data = load_filtered(years, types)
+    # Group on Route alone; the city names and coordinates are functionally
+    # determined by it, so they are joined back onto just the ten winners
+    agg = data.groupby("Route", observed=True, sort=False)["Passengers"].sum().nlargest(10).reset_index()
+    coord_map = data.drop_duplicates("Route").set_index("Route")[
+        ["From", "To", "From_Lat", "From_Lon", "To_Lat", "To_Lon"]
+    ]
+    return agg.join(coord_map, on="Route")
+
+# Define a custom color palette
+custom_palette = ['#22223b', '#4a4e69', '#9a8c98', '#c9ada7', '#f2e9e4']
+
+# Charts rendered once to PNG bytes and memoized per filter selection;
+# st.image then serves the cached bytes instead of re-running the
+# matplotlib/seaborn layout on every rerun
+@st.cache_data(show_spinner=False)
+def _yearly_chart(years, types):
+    yearly_passengers = _yearly(years, types).reset_index()
+    fig, ax = plt.subplots()
+
+    sns.lineplot(data=yearly_passengers, x="Year", y="Passengers", marker="o", ax=ax, color=custom_palette[0],)
+    plt.title(
+        "Total Passenger Numbers Over Time",
+        fontsize=20,
+        color="#22223b",
+        weight="bold",
+        pad=20
+    )
+    ax.set_ylabel("Passengers (Millions)",fontsize=14, color="#4a4e69", labelpad=10)
+    ax.set_xlabel("Year",fontsize=14, color="#4a4e69", labelpad=10)
+    sns.set_style("whitegrid", {"axes.facecolor": "#f2e9e4","grid.color": "#c9ada7","grid.linestyle": "--"})
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)
+    # Close the figure so it does not linger in pyplot's global registry
+    plt.close(fig)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False)
+def _departure_chart(years, types):
+    top_departure_countries = _top_departure(years, types)
+    custom_colors = ['#4a4e69', '#9a8c98']
+    # Create the axes explicitly and hand them to pandas; .plot() would
+    # otherwise open a second figure and both would leak across reruns
+    fig, ax = plt.subplots(figsize=(10, 6))
+    top_departure_countries.plot(
+        kind="bar",
+        color=custom_colors,
+        ax=ax
+    )
+    plt.title(
+        "Top 5 Departure Countries by Route Type",
+        fontsize=18,
+        color="#22223b",
+        weight="bold",
+        pad=20
+    )
+    plt.xlabel("Country", fontsize=14, color="#4a4e69", labelpad=10)
+    plt.ylabel("Total Passengers (in millions)", fontsize=14, color="#4a4e69", labelpad=10)
+    plt.xticks(fontsize=12, color="#9a8c98", rotation=45, ha="right")
+    plt.yticks(fontsize=12, color="#9a8c98")
+    plt.legend(
+        title="Route Type",
+        title_fontsize=12,
+        fontsize=10,
+        loc="upper right",
+        frameon=False
+    )
+    plt.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)
+    plt.close(fig)
+    return buf.getvalue()
+
+# Static map furniture (the Palestine marker and the legend) built once per
+# process; rebuilding them re-parses the same HTML into folium element
+# trees on every map construction
+@st.cache_resource
+def _static_map_elements():
+    palestine_marker = folium.Marker(
+        location=[31.5, 34.5],
+        tooltip="Palestine - Center of the region",
+        popup=folium.Popup(
+            html="""
+            <div style="text-align: center;">
+                <div style="font-size: 18pt; font-weight: bold; font-style: italic; color: #800000;">
+                    🇵🇸 Palestine
+                </div>
+            </div>
+            """,
+            max_width=250
+        ),
+        icon=folium.DivIcon(
+            html="""
+            <div style="
+                padding: 5px 10px;
+                font-size: 16pt;
+                font-weight: bold;
+                font-style: italic;
+                color: #bc4749;
+                text-align: center;">
+                Palestine
+            </div>
+            """
+        )
+    )
+    legend_element = folium.Element('''
+    <div style="position: fixed;
+                bottom: 50px; left: 50px; width: 250px; height: 140px;
+                background-color: white; z-index:1000; font-size:14px;
+                border:2px solid grey; padding: 10px;">
+        <b>Legend</b><br>
+        <div style="display: flex; align-items: center;">
+            <div style="width: 10px; height: 10px; background-color: green; margin-right: 8px;"></div> Departure
+        </div>
+        <div style="display: flex; align-items: center;">
+            <div style="width: 10px; height: 10px; background-color: red; margin-right: 8px;"></div> Destination
+        </div>
+        <div style="display: flex; align-items: center;">
+            <div style="width: 10px; height: 10px; background-color: gray; margin-right: 8px;"></div> Route (Thickness = Traffic)
+        </div>
+        <div style="display: flex; align-items: center;">
+            <div style="width: 10px; height: 10px; background-color: blue; margin-right: 8px;"></div> Midpoint
+        </div>
+    </div>
+    ''')
+    return palestine_marker, legend_element
+
+# Function to build the interactive map and render it to an HTML string;
+# cached on the filter selection so unrelated reruns reuse the string
+@st.cache_data(show_spinner=False)
+def _build_map_html(years, types):
+    top_routes = _top_routes(years, types)
 
-# Load data
-df = load_data()
+    # prefer_canvas renders markers and lines on a single canvas instead
+    # of one SVG DOM node each, which keeps pan/zoom smooth
+    m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB positron", prefer_canvas=True)
+    routes_group = folium.FeatureGroup(name="Flight Routes")
+    # Airport markers start hidden; they can be toggled on from the
+    # layer control when needed
+    markers_group = folium.FeatureGroup(name="Airport Markers", show=False)
 
-if df is not None:
-    # Remove '_id' column from MongoDB if present
-    if '_id' in df.columns:
-        df = df.drop(columns=['_id'])
+    # Add Palestine marker
+    palestine_marker, legend_element = _static_map_elements()
+    palestine_marker.add_to(m)
+
+    # Precompute the popup HTML with vectorized string ops so the loop
+    # below only calls the folium constructors
+    top_routes = top_routes.assign(
+        dep_popup="<b>Departure:</b> " + top_routes["From"].astype(str)
+        + "<br><b>Latitude:</b> " + top_routes["From_Lat"].astype(str)
+        + "<br><b>Longitude:</b> " + top_routes["From_Lon"].astype(str),
+        dest_popup="<b>Destination:</b> " + top_routes["To"].astype(str)
+        + "<br><b>Latitude:</b> " + top_routes["To_Lat"].astype(str)
+        + "<br><b>Longitude:</b> " + top_routes["To_Lon"].astype(str),
+        route_popup="<b>Route:</b> " + top_routes["Route"].astype(str)
+        + "<br><b>Passengers:</b> " + top_routes["Passengers"].map("{:,}".format),
+        mid_popup="<b>Midpoint of Route:</b> " + top_routes["Route"].astype(str),
+    )
+
+    # Line thickness scales with traffic; normalize once outside the loop
+    pax_max = top_routes["Passengers"].max() or 1
+    line_weights = 2 + top_routes["Passengers"].to_numpy() / pax_max * 5
+
+    # Route midpoints as two vector adds instead of per-row Python floats
+    mid_lats = (top_routes["From_Lat"].to_numpy() + top_routes["To_Lat"].to_numpy()) * 0.5
+    mid_lons = (top_routes["From_Lon"].to_numpy() + top_routes["To_Lon"].to_numpy()) * 0.5
+
+    # Add routes and markers
+    for i, row in enumerate(top_routes.itertuples(index=False)):
+        start = (row.From_Lat, row.From_Lon)
+        end = (row.To_Lat, row.To_Lon)
+        folium.CircleMarker(
+            location=start,
+            radius=6,
+            color="green",
+            fill=True,
+            fill_color="green",
+            tooltip=f"Departure: {row.From}",
+            popup=folium.Popup(row.dep_popup, max_width=250)
+        ).add_to(markers_group)
+        folium.CircleMarker(
+            location=end,
+            radius=6,
+            color="red",
+            fill=True,
+            fill_color="red",
+            tooltip=f"Destination: {row.To}",
+            popup=folium.Popup(row.dest_popup, max_width=250)
+        ).add_to(markers_group)
+        folium.PolyLine(
+            locations=[start, end],
+            color="gray",
+            weight=line_weights[i],
+            popup=folium.Popup(row.route_popup, max_width=300)
+        ).add_to(routes_group)
+        folium.Marker(
+            location=[mid_lats[i], mid_lons[i]],
+            icon=folium.Icon(icon="plane", prefix="fa", color="blue"),
+            tooltip=f"Midpoint of {row.Route}",
+            popup=folium.Popup(row.mid_popup, max_width=250)
+        ).add_to(routes_group)
+
+    routes_group.add_to(m)
+    markers_group.add_to(m)
+    folium.LayerControl().add_to(m)
+    m.add_child(MeasureControl(primary_length_unit='kilometers'))
+    Fullscreen().add_to(m)
+    m.get_root().html.add_child(legend_element)
+    m.fit_bounds(routes_group.get_bounds())
+    return m.get_root().render()
+
+# Load the filter schema (this also establishes which source is available)
+schema = load_schema()
+
+if schema is not None:
+    year_options, route_type_options, data_source = schema
 
     # Sidebar for filters
     st.sidebar.header("Filter Options")
-    year_options = sorted(df["Year"].unique())
     selected_year = st.sidebar.multiselect("Select Year(s)", year_options, default=year_options)
-    route_type_options = df["Type"].unique()
     selected_type = st.sidebar.multiselect("Select Route Type(s)", route_type_options, default=route_type_options)
 
-    # Filter DataFrame
-    filtered_df = df[df["Year"].isin(selected_year) & df["Type"].isin(selected_type)]
+    # Filter server-side (or against the cached CSV frame); the tuples double
+    # as the cache key for the memoized aggregations below
+    years_key = tuple(selected_year)
+    types_key = tuple(selected_type)
+    filtered_df = load_filtered(years_key, types_key)
+    st.success(f"Data loaded from {data_source}")
 
-    # Key Metrics
+    # Key Metrics — derived from the shared memoized aggregates so each
+    # metric reuses a scan instead of re-reading the whole frame
     st.header("Key Metrics")
     col1, col2, col3 = st.columns(3)
-    total_passengers = filtered_df["Passengers"].sum()
+    grp_year = _yearly(years_key, types_key)
+    grp_country_type = _country_type(years_key, types_key)
+    total_passengers = grp_year.sum()
     total_routes = len(filtered_df)
-    top_country = filtered_df.groupby("From_Country")["Passengers"].sum().idxmax()
+    top_country = grp_country_type.groupby(level=0, observed=True).sum().idxmax()
     col1.metric("Total Passengers", f"{total_passengers:,}")
     col2.metric("Total Routes", total_routes)
     col3.metric("Top Origin Country", top_country)
 
     # Data Table
     st.header("Flight Routes Data")
-    st.dataframe(filtered_df, use_container_width=True)
-
-    # Define a custom color palette
-    custom_palette = ['#22223b', '#4a4e69', '#9a8c98', '#c9ada7', '#f2e9e4']
-
+    # Only ship the human-readable columns to the browser; the coordinate
+    # floats would double the Arrow payload without adding anything here
+    st.dataframe(
+        filtered_df[["Year", "Route", "Type", "Passengers", "From_Country"]],
+        use_container_width=True,
+        height=400,
+    )
 
     # Passenger Trends by Year
     st.header("Passenger Trends by Year")
-    yearly_passengers = filtered_df.groupby("Year")["Passengers"].sum().reset_index()
-    fig, ax = plt.subplots()
-    
-    sns.lineplot(data=yearly_passengers, x="Year", y="Passengers", marker="o", ax=ax, color=custom_palette[0],)
-    plt.title(
-        "Total Passenger Numbers Over Time", 
-        fontsize=20, 
-        color="#22223b", 
-        weight="bold", 
-        pad=20  
-    )  
-    ax.set_ylabel("Passengers (Millions)",fontsize=14, color="#4a4e69", labelpad=10)
-    ax.set_xlabel("Year",fontsize=14, color="#4a4e69", labelpad=10)
-    sns.set_style("whitegrid", {"axes.facecolor": "#f2e9e4","grid.color": "#c9ada7","grid.linestyle": "--"})
-    st.pyplot(fig)
+    st.image(_yearly_chart(years_key, types_key))
 
     # Top Departure Countries by Route Type
     st.header("Top 5 Departure Countries by Route Type")
     try:
-        top_departure_countries = filtered_df.groupby(["From_Country", "Type"])["Passengers"].sum().unstack().fillna(0)
-        top_departure_countries["Total"] = top_departure_countries.sum(axis=1)
-        top_departure_countries = top_departure_countries.sort_values("Total", ascending=False).head(5).drop(columns="Total")
-        custom_colors = ['#4a4e69', '#9a8c98']
-        plt.figure(figsize=(10, 6))
-        top_departure_countries.plot(
-            kind="bar",
-            color=custom_colors
-        )
-        plt.title(
-            "Top 5 Departure Countries by Route Type",
-            fontsize=18,
-            color="#22223b",
-            weight="bold",
-            pad=20
-        )
-        plt.xlabel("Country", fontsize=14, color="#4a4e69", labelpad=10)
-        plt.ylabel("Total Passengers (in millions)", fontsize=14, color="#4a4e69", labelpad=10)
-        plt.xticks(fontsize=12, color="#9a8c98", rotation=45, ha="right")
-        plt.yticks(fontsize=12, color="#9a8c98")
-        plt.legend(
-            title="Route Type",
-            title_fontsize=12,
-            fontsize=10,
-            loc="upper right",
-            frameon=False
-        )
-        plt.tight_layout()
-        st.pyplot(plt)
+        st.image(_departure_chart(years_key, types_key))
     except Exception as e:
         st.error(f"Error rendering departure countries chart: {e}")
 
     # Top 10 Busiest Routes
     st.header("Top 10 Busiest Routes")
-    route_data = filtered_df.groupby(["Route", "From", "To", "From_Lat", "From_Lon", "To_Lat", "To_Lon"])["Passengers"].sum().reset_index()
-    top_routes = route_data.sort_values("Passengers", ascending=False).head(10)
+    top_routes = _top_routes(years_key, types_key)
     st.table(top_routes[["Route", "Passengers"]])
 
-    # Interactive Map
+    # Interactive Map — the rendered HTML is memoized per filter selection,
+    # so reruns that keep the same filters skip the Folium rebuild and the
+    # Jinja2 template rendering entirely
     st.header("Interactive Flight Routes Map")
     try:
-        m = folium.Map(location=[20, 0], zoom_start=2, tiles="CartoDB positron")
-        routes_group = folium.FeatureGroup(name="Flight Routes")
-        markers_group = folium.FeatureGroup(name="Airport Markers")
-
-        # Add Palestine marker
-        palestine_center = [31.5, 34.5]
-        folium.Marker(
-            location=palestine_center,
-            tooltip="Palestine - Center of the region",
-            popup=folium.Popup(
-                html="""
-                <div style="text-align: center;">
-                    <div style="font-size: 18pt; font-weight: bold; font-style: italic; color: #800000;">
-                        🇵🇸 Palestine
-                    </div>
-                </div>
-                """,
-                max_width=250
-            ),
-            icon=folium.DivIcon(
-                html="""
-                <div style="
-                    padding: 5px 10px;
-                    font-size: 16pt;
-                    font-weight: bold;
-                    font-style: italic;
-                    color: #bc4749;
-                    text-align: center;">
-                    Palestine
-                </div>
-                """
-            )
-        ).add_to(m)
-
-        # Add routes and markers
-        for _, row in top_routes.iterrows():
-            start = (row["From_Lat"], row["From_Lon"])
-            end = (row["To_Lat"], row["To_Lon"])
-            passenger_count = row["Passengers"]
-            line_weight = 2 + passenger_count / max(top_routes["Passengers"]) * 5 if not top_routes["Passengers"].empty else 2
-            folium.CircleMarker(
-                location=start,
-                radius=6,
-                color="green",
-                fill=True,
-                fill_color="green",
-                tooltip=f"Departure: {row['From']}",
-                popup=folium.Popup(f"""
-                <b>Departure:</b> {row['From']}<br>
-                <b>Latitude:</b> {row['From_Lat']}<br>
-                <b>Longitude:</b> {row['From_Lon']}
-                """, max_width=250)
-            ).add_to(markers_group)
-            folium.CircleMarker(
-                location=end,
-                radius=6,
-                color="red",
-                fill=True,
-                fill_color="red",
-                tooltip=f"Destination: {row['To']}",
-                popup=folium.Popup(f"""
-                <b>Destination:</b> {row['To']}<br>
-                <b>Latitude:</b> {row['To_Lat']}<br>
-                <b>Longitude:</b> {row['To_Lon']}
-                """, max_width=250)
-            ).add_to(markers_group)
-            folium.PolyLine(
-                locations=[start, end],
-                color="gray",
-                weight=line_weight,
-                popup=folium.Popup(f"""
-                <b>Route:</b> {row['Route']}<br>
-                <b>Passengers:</b> {row['Passengers']:,}
-                """, max_width=300)
-            ).add_to(routes_group)
-            mid_lat = (row["From_Lat"] + row["To_Lat"]) / 2
-            mid_lon = (row["From_Lon"] + row["To_Lon"]) / 2
-            folium.Marker(
-                location=[mid_lat, mid_lon],
-                icon=folium.Icon(icon="plane", prefix="fa", color="blue"),
-                tooltip=f"Midpoint of {row['Route']}",
-                popup=folium.Popup(f"""
-                <b>Midpoint of Route:</b> {row['Route']}
-                """, max_width=250)
-            ).add_to(routes_group)
-
-        routes_group.add_to(m)
-        markers_group.add_to(m)
-        folium.LayerControl().add_to(m)
-        m.add_child(MeasureControl(primary_length_unit='kilometers'))
-        Fullscreen().add_to(m)
-        legend_html = '''
-        <div style="position: fixed;
-                    bottom: 50px; left: 50px; width: 250px; height: 140px;
-                    background-color: white; z-index:1000; font-size:14px;
-                    border:2px solid grey; padding: 10px;">
-            <b>Legend</b><br>
-            <div style="display: flex; align-items: center;">
-                <div style="width: 10px; height: 10px; background-color: green; margin-right: 8px;"></div> Departure
-            </div>
-            <div style="display: flex; align-items: center;">
-                <div style="width: 10px; height: 10px; background-color: red; margin-right: 8px;"></div> Destination
-            </div>
-            <div style="display: flex; align-items: center;">
-                <div style="width: 10px; height: 10px; background-color: gray; margin-right: 8px;"></div> Route (Thickness = Traffic)
-            </div>
-            <div style="display: flex; align-items: center;">
-                <div style="width: 10px; height: 10px; background-color: blue; margin-right: 8px;"></div> Midpoint
-            </div>
-        </div>
-        '''
-        m.get_root().html.add_child(folium.Element(legend_html))
-        m.fit_bounds(routes_group.get_bounds())
-        folium_static(m, width=1200, height=600)
+        # Reruns fired by events that do not touch the filters (sidebar
+        # resizes, unrelated widgets) reuse the HTML held in session state
+        # without even going through the cache lookup
+        filter_key = (years_key, types_key)
+        if st.session_state.get("last_map_key") == filter_key and "last_map_html" in st.session_state:
+            map_html = st.session_state.last_map_html
+        else:
+            map_html = _build_map_html(years_key, types_key)
+            st.session_state.last_map_key = filter_key
+            st.session_state.last_map_html = map_html
+        components.html(map_html, width=1200, height=600)
     except Exception as e:
         st.error(f"Error rendering map: {e}")
 else: